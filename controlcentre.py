@@ -1,17 +1,23 @@
-# controlcentre.py (updated strict wakeword + blocking mode)
+# controlcentre.py (updated strict wakeword + in-process features)
 """
 Voice-first controller (updated):
- - Wake word strictly requires "jarvis" at start or alone.
+ - Wake word comes from dynamicbot.WakeWordDetector when a keyword engine is
+   installed (Porcupine: "jarvis", openWakeWord: "hey jarvis"); otherwise speech
+   recognition is polled and "jarvis" is strictly required at start or alone.
  - Avoids false triggers from normal commands being misheard.
- - Controller pauses listening while a feature is active, resumes after it exits.
+ - Features run in-process on the main thread (OpenCV windows need a single,
+   main GUI thread); voice control runs on a worker thread and keeps listening
+   so features can be stopped by voice. It announces when they exit.
 
 Usage: python controlcentre.py
 """
 
 import os
+import re
 import sys
-import subprocess
+import queue
 import time
+import threading
 import traceback
 import importlib
 from typing import Optional
@@ -20,17 +26,30 @@ BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 if BASE_DIR not in sys.path:
     sys.path.insert(0, BASE_DIR)
 
-PYTHON_EXE = sys.executable
 WAKEWORD = os.getenv("WAKEWORD", "jarvis").lower()
 
 MODULE_NAMES = {
-    "face": "facerecognition.py",
-    "hand": "objectdetection.py",
-    "object": "objectdetection.py",
-    "servo": "objectdetection.py",
+    "face": "facerecognition",
+    "hand": "objectdetection",
+    "object": "objectdetection",
+    "servo": "objectdetection",
 }
 
-running_procs = {}
+# Keyword matchers for parse_start_stop_command; named groups give the canonical value.
+ACTION_RE = re.compile(
+    r"\b(?:(?P<start>start(?:s|ed|ing)?|run(?:s|ning)?|open(?:s|ed|ing)?|launch(?:es|ed|ing)?)"
+    r"|(?P<stop>stop(?:s|ped|ping)?|clos(?:e|es|ed|ing)|terminat(?:e|es|ed|ing)|quit(?:s|ting)?"
+    r"|shut(?:ting)? ?down|end(?:s|ed|ing)?))\b"
+)
+TARGET_RE = re.compile(
+    r"\b(?:(?P<chatbot>chat(?:bot)?s?|assistant|bot)"
+    r"|(?P<face>faces?|facial|recogni(?:[sz](?:e|es|ed|er|ing|ation)|tion))"
+    r"|(?P<hand>hands?|servos?|objects?|fingers?))\b"
+)
+STATUS_RE = re.compile(r"\bstatus\b")
+
+running_features = {}  # module name -> (stop_event, done_event)
+feature_jobs = queue.Queue()  # (key, module, stop_event, done_event), run on the main thread
 
 try:
     dynamicbot = importlib.import_module("dynamicbot")
@@ -50,46 +69,65 @@ def safe_speak(text: str) -> None:
     print("BOT:", text)
 
 
-def start_subprocess_module(key: str) -> Optional[subprocess.Popen]:
-    key_lower = key.lower()
-    script = MODULE_NAMES.get(key_lower)
-    if not script:
-        return None
-    script_path = os.path.join(BASE_DIR, script)
-    if not os.path.exists(script_path):
-        print(f"[controller] Script not found: {script_path}")
-        return None
-    proc = running_procs.get(key_lower)
-    if proc and proc.poll() is None:
-        print(f"[controller] {key_lower} already running (pid {proc.pid})")
-        return proc
+def is_feature_running(key: str) -> bool:
+    module_name = MODULE_NAMES.get(key.lower())
+    entry = running_features.get(module_name)
+    return entry is not None and not entry[1].is_set()
+
+
+def run_feature_job(key: str, mod, stop_event: threading.Event, done_event: threading.Event) -> None:
     try:
-        p = subprocess.Popen([PYTHON_EXE, script_path], cwd=BASE_DIR)
-        running_procs[key_lower] = p
-        print(f"[controller] Started {key_lower} -> PID {p.pid}")
-        return p
+        mod.main(stop_event=stop_event)
     except Exception as e:
-        print("[controller] Failed to start subprocess:", e)
-        return None
+        print(f"[controller] {key} raised exception:", e)
+        traceback.print_exc()
+    finally:
+        done_event.set()
+    if not stop_event.is_set():
+        safe_speak(f"{key} finished.")  # exited on its own (e.g. 'q' pressed)
 
 
-def stop_subprocess_module(key: str) -> bool:
+def start_feature(key: str) -> bool:
+    """Import a feature module (cached after the first time) and queue its main() for the main thread."""
     key_lower = key.lower()
-    proc = running_procs.get(key_lower)
-    if not proc:
+    module_name = MODULE_NAMES.get(key_lower)
+    if not module_name:
         return False
-    if proc.poll() is None:
-        try:
-            proc.terminate()
-            try:
-                proc.wait(timeout=2.0)
-            except subprocess.TimeoutExpired:
-                proc.kill()
-            print(f"[controller] Stopped {key_lower}")
-        except Exception as e:
-            print("[controller] Failed to stop:", e)
-            return False
-    running_procs.pop(key_lower, None)
+    if is_feature_running(key_lower):
+        print(f"[controller] {key_lower} already running")
+        return True
+    try:
+        mod = importlib.import_module(module_name)
+    except Exception:
+        print(f"[controller] Failed to import {module_name}. Traceback:")
+        traceback.print_exc()
+        return False
+    stop_event = threading.Event()
+    done_event = threading.Event()
+    running_features[module_name] = (stop_event, done_event)
+    feature_jobs.put((key_lower, mod, stop_event, done_event))
+    print(f"[controller] Started {key_lower}")
+    return True
+
+
+def stop_feature(key: str) -> bool:
+    """Ask a feature to stop. Returns False if it wasn't running.
+
+    The entry is only dropped once the feature has returned, so one that is
+    slow to stop (e.g. waiting in input()) still counts as holding the camera.
+    """
+    module_name = MODULE_NAMES.get(key.lower())
+    entry = running_features.get(module_name)
+    if entry is None or entry[1].is_set():
+        running_features.pop(module_name, None)
+        return False
+    stop_event, done_event = entry
+    stop_event.set()
+    if done_event.wait(timeout=2.0):
+        running_features.pop(module_name, None)
+        print(f"[controller] Stopped {key}")
+    else:
+        print(f"[controller] {key} did not stop within 2s; still stopping")
     return True
 
 
@@ -97,20 +135,13 @@ def parse_start_stop_command(text: str):
     if not text:
         return (None, None)
     t = text.lower()
-    action = None
-    if any(w in t for w in ["start", "run", "open", "launch"]):
-        action = "start"
-    if any(w in t for w in ["stop", "close", "terminate", "quit", "shutdown", "end"]):
-        action = "stop"
-    target = None
-    if "chat" in t or "assistant" in t or "bot" in t:
-        target = "chatbot"
-    elif "face" in t or "recognize" in t or "recognition" in t:
-        target = "face"
-    elif any(w in t for w in ["hand", "servo", "object", "finger"]):
-        target = "hand"
-    if "status" in t:
+    if STATUS_RE.search(t):
         return ("status", None)
+    # "stop" wins over "start", and chatbot > face > hand, as before
+    actions = {m.lastgroup for m in ACTION_RE.finditer(t)}
+    action = "stop" if "stop" in actions else ("start" if "start" in actions else None)
+    targets = {m.lastgroup for m in TARGET_RE.finditer(t)}
+    target = next((k for k in ("chatbot", "face", "hand") if k in targets), None)
     return (action, target)
 
 
@@ -149,16 +180,32 @@ def listen_for_wakeword_fallback(wakeword: str = WAKEWORD, max_attempts: Optiona
         time.sleep(0.15)
 
 
+_wake_detector = None
+_wake_detector_checked = False
+
+
+def get_wake_detector():
+    """Return the shared keyword detector, or None (reported once) to use the STT fallback."""
+    global _wake_detector, _wake_detector_checked
+    if not _wake_detector_checked:
+        _wake_detector_checked = True
+        if dynamicbot is not None and hasattr(dynamicbot, "WakeWordDetector"):
+            try:
+                _wake_detector = dynamicbot.WakeWordDetector()
+            except Exception as e:
+                print("[controller] dynamicbot.WakeWordDetector init failed, using speech fallback:", e)
+    return _wake_detector
+
+
+def wake_phrase() -> str:
+    detector = get_wake_detector()
+    return detector.phrase if detector is not None else WAKEWORD
+
+
 def controller_listen_for_single_command() -> Optional[str]:
-    used_detector = None
-    if dynamicbot is not None and hasattr(dynamicbot, "WakeWordDetector"):
-        try:
-            used_detector = dynamicbot.WakeWordDetector()
-        except Exception as e:
-            print("[controller] dynamicbot.WakeWordDetector init failed:", e)
-            used_detector = None
+    used_detector = get_wake_detector()
     try:
-        print(f"[controller] Waiting for wake word (say '{WAKEWORD}')...")
+        print(f"[controller] Waiting for wake word (say '{wake_phrase()}')...")
         if used_detector is not None:
             ok = listen_for_wakeword_with_detector(used_detector)
         else:
@@ -184,12 +231,22 @@ def controller_listen_for_single_command() -> Optional[str]:
         return None
 
 
-def main_voice_controller():
-    if dynamicbot is None:
-        print("[controller] dynamicbot missing — cannot run voice controller.")
-        safe_speak("Controller cannot start voice mode because dynamicbot is missing.")
-        return
-    safe_speak(f"Controller ready. Say the wake word '{WAKEWORD}' and then say start or stop followed by chatbot, face, or hand.")
+def _warmup() -> None:
+    """Pre-load the mic, speech models, Ollama model and feature modules so the first command has no cold start."""
+    try:
+        dynamicbot.warmup()
+    except Exception as e:
+        print("[controller] Warmup failed:", e)
+    for module_name in set(MODULE_NAMES.values()):
+        try:
+            importlib.import_module(module_name)
+        except Exception as e:
+            print(f"[controller] Could not preload {module_name}:", e)
+    print("[controller] Warmup finished.")
+
+
+def voice_loop() -> None:
+    """Wake word / command loop; runs on a worker thread while features use the main thread."""
     try:
         while True:
             cmd = controller_listen_for_single_command()
@@ -203,9 +260,13 @@ def main_voice_controller():
             action, target = parse_start_stop_command(cmd)
             if action == "status":
                 parts = []
-                for k in set(MODULE_NAMES.keys()):
-                    p = running_procs.get(k)
-                    state = "running" if p and p.poll() is None else "stopped"
+                # hand, object and servo share one module, so report each module once
+                reported = set()
+                for k, module_name in MODULE_NAMES.items():
+                    if module_name in reported:
+                        continue
+                    reported.add(module_name)
+                    state = "running" if is_feature_running(k) else "stopped"
                     parts.append(f"{k} is {state}")
                 safe_speak("Status: " + ". ".join(parts))
                 continue
@@ -227,27 +288,62 @@ def main_voice_controller():
                     safe_speak("Returned to controller. Say the wake word to give another command.")
                     continue
                 else:
-                    proc = start_subprocess_module(target)
-                    if proc:
-                        safe_speak(f"Starting {target}. Controller will pause until it stops.")
-                        proc.wait()  # block until subprocess exits
-                        safe_speak(f"{target} finished. Controller listening again.")
+                    # Every feature uses the webcam, so only one runs at a time
+                    other = next((k for k in MODULE_NAMES if MODULE_NAMES[k] != MODULE_NAMES[target] and is_feature_running(k)), None)
+                    if other is not None:
+                        safe_speak(f"{other} is using the camera. Stop {other} first.")
+                    elif start_feature(target):
+                        safe_speak(f"Starting {target}. Say the wake word and stop {target} to end it.")
                     else:
                         safe_speak(f"Couldn't start {target}.")
                     continue
             if action == "stop":
                 if target == "chatbot":
-                    safe_speak("If the assistant is running, say bye to it. If you started a chatbot as a subprocess, say stop chatbot again.")
+                    safe_speak("If the assistant is running, say bye to it.")
                     continue
                 else:
-                    ok = stop_subprocess_module(target)
-                    safe_speak(f"Stopped {target}." if ok else f"{target} was not running.")
+                    if not stop_feature(target):
+                        safe_speak(f"{target} was not running.")
+                    elif is_feature_running(target):
+                        safe_speak(f"{target} is still stopping. Check the terminal if it is waiting for input.")
+                    else:
+                        safe_speak(f"Stopped {target}.")
                     continue
+    except Exception as e:
+        print("[controller] Voice loop crashed:", e)
+        traceback.print_exc()
+    finally:
+        # Let a feature running on the main thread return so the controller can exit
+        for stop_event, _ in list(running_features.values()):
+            stop_event.set()
+
+
+def main_voice_controller():
+    if dynamicbot is None:
+        print("[controller] dynamicbot missing — cannot run voice controller.")
+        safe_speak("Controller cannot start voice mode because dynamicbot is missing.")
+        return
+    safe_speak(f"Controller ready. Say the wake word '{wake_phrase()}' and then say start or stop followed by chatbot, face, or hand.")
+    # Started after the greeting is queued so the first mic calibration waits for it to finish
+    if hasattr(dynamicbot, "warmup"):
+        threading.Thread(target=_warmup, daemon=True).start()
+    voice = threading.Thread(target=voice_loop, daemon=True)
+    voice.start()
+    try:
+        # The main thread owns all OpenCV windows: run features here, one at a time
+        while voice.is_alive():
+            try:
+                job = feature_jobs.get(timeout=0.2)
+            except queue.Empty:
+                continue
+            run_feature_job(*job)
     except KeyboardInterrupt:
         print("Controller interrupted by user.")
     finally:
-        for k in list(running_procs.keys()):
-            stop_subprocess_module(k)
+        for stop_event, _ in list(running_features.values()):
+            stop_event.set()
+        if hasattr(dynamicbot, "wait_until_spoken"):
+            dynamicbot.wait_until_spoken()  # let queued speech finish before exiting
 
 
 if __name__ == "__main__":
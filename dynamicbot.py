@@ -1,12 +1,36 @@
 # dynamicbot_no_wake.py
+import json
+import queue
+import re
+import threading
 import ollama
 import pyttsx3
 import speech_recognition as sr
 import time
 import datetime
 import os
+import numpy as np
+from collections import OrderedDict, deque
 from dotenv import load_dotenv
 
+# Optional offline speech recognition (falls back to Google Web Speech if missing)
+try:
+    import vosk
+    import webrtcvad
+except ImportError:
+    vosk = None
+    webrtcvad = None
+
+# Optional always-on wake-word engines (controller falls back to STT polling if missing)
+try:
+    import pvporcupine
+except ImportError:
+    pvporcupine = None
+try:
+    from openwakeword.model import Model as OpenWakeWordModel
+except ImportError:
+    OpenWakeWordModel = None
+
 # ====== Real time date/time helpers ======
 def get_current_date():
     today = datetime.date.today()
@@ -21,24 +45,154 @@ def get_current_time():
     return f"The current time is {now.strftime('%I:%M %p')}."
 
 # ====== Voice Bot TTS / STT setup ======
-engine = pyttsx3.init()
-engine.setProperty("rate", 180)
-engine.setProperty("volume", 1.0)
+TTS_Q = queue.Queue()
+
+def _tts_worker():
+    """Owns the pyttsx3 engine and speaks queued text in order (print-only if TTS can't start)."""
+    try:
+        engine = pyttsx3.init()
+        engine.setProperty("rate", 180)
+        engine.setProperty("volume", 1.0)
+    except Exception as e:
+        print("TTS unavailable, text will only be printed:", e)
+        engine = None
+    while True:
+        text = TTS_Q.get()
+        try:
+            if engine is not None:
+                engine.say(text)
+                engine.runAndWait()
+        except Exception as e:
+            print("TTS failed:", e)
+        finally:
+            TTS_Q.task_done()
+
+_tts_thread = threading.Thread(target=_tts_worker, daemon=True)
+_tts_thread.start()
 
 recognizer = sr.Recognizer()
-mic = sr.Microphone()
+# 16 kHz / 480-sample (30 ms) chunks are what webrtcvad accepts
+mic = sr.Microphone(sample_rate=16000, chunk_size=480)
+RECALIBRATE_INTERVAL = 60  # seconds between background ambient-noise calibrations
+
+VOSK_MODEL_PATH = os.getenv("VOSK_MODEL_PATH", "vosk-model-small-en-us-0.15")
+VAD_AGGRESSIVENESS = 2
+VAD_END_SILENCE = 0.5  # seconds of non-speech that end an utterance
+VAD_PREROLL = 0.3      # seconds of audio kept from before speech was detected
+_vosk_model = None
+_vosk_lock = threading.Lock()  # warmup and the first listen() may both try to load it
+
+_mic_lock = threading.Lock()
+_mic_source = None  # opened once on first use and reused by every listen()
+
+def _recalibrate_loop():
+    """Periodically re-measure ambient noise while the mic is idle."""
+    while True:
+        time.sleep(RECALIBRATE_INTERVAL)
+        wait_until_spoken()  # don't measure the bot's own voice as ambient noise
+        with _mic_lock:
+            if TTS_Q.unfinished_tasks:
+                continue  # speech was queued while waiting for the lock; try next interval
+            try:
+                _drain_mic(_mic_source)
+                recognizer.adjust_for_ambient_noise(_mic_source, duration=0.5)
+            except Exception as e:
+                print("Ambient noise calibration failed:", e)
+
+def _drain_mic(source):
+    """Discard audio buffered since the last read so listening starts on live input."""
+    stream = source.stream.pyaudio_stream
+    available = stream.get_read_available()
+    if available > 0:
+        stream.read(available, exception_on_overflow=False)
+
+def _get_mic_source():
+    """Open the microphone stream once, calibrate it, and start periodic recalibration."""
+    global _mic_source
+    if _mic_source is None:
+        wait_until_spoken()  # calibrate on room noise, not on the bot's voice
+    with _mic_lock:
+        if _mic_source is None:
+            source = mic.__enter__()
+            recognizer.adjust_for_ambient_noise(source, duration=1.0)
+            _mic_source = source
+            threading.Thread(target=_recalibrate_loop, daemon=True).start()
+    return _mic_source
 
 def speak(text):
-    """Speak text via TTS and also print to console."""
+    """Queue text for TTS (non-blocking) and also print to console."""
     print("🤖 Bot:", text)
-    engine.say(text)
-    engine.runAndWait()
+    TTS_Q.put(text)
+
+def wait_until_spoken():
+    """Block until everything queued with speak() has been said (returns early if the TTS thread died)."""
+    with TTS_Q.all_tasks_done:
+        while TTS_Q.unfinished_tasks and _tts_thread.is_alive():
+            TTS_Q.all_tasks_done.wait(0.1)
+
+def _get_vosk_model():
+    """Load the local Vosk model once; returns None if offline recognition is unavailable."""
+    global _vosk_model
+    with _vosk_lock:
+        if _vosk_model is None and vosk is not None and os.path.isdir(VOSK_MODEL_PATH):
+            try:
+                _vosk_model = vosk.Model(VOSK_MODEL_PATH)
+            except Exception as e:
+                print("Failed to load Vosk model:", e)
+    return _vosk_model
+
+def _listen_local(source, model, timeout, phrase_time_limit):
+    """VAD-gated streaming recognition with Vosk. Returns lowercase text or None."""
+    vad = webrtcvad.Vad(VAD_AGGRESSIVENESS)
+    rec = vosk.KaldiRecognizer(model, source.SAMPLE_RATE)
+    frame_bytes = source.CHUNK * source.SAMPLE_WIDTH
+    frame_secs = source.CHUNK / source.SAMPLE_RATE
+    preroll = deque(maxlen=max(1, int(VAD_PREROLL / frame_secs)))
+    start = time.monotonic()
+    speech_start = None
+    silence = 0.0
+    pieces = []  # text of segments Vosk's own endpointer has already closed
+
+    def accept(frame):
+        if rec.AcceptWaveform(frame):
+            pieces.append(json.loads(rec.Result()).get("text", ""))
+
+    while True:
+        frame = source.stream.read(source.CHUNK)
+        if len(frame) != frame_bytes:
+            continue
+        now = time.monotonic()
+        is_speech = vad.is_speech(frame, source.SAMPLE_RATE)
+        if speech_start is None:
+            if not is_speech:
+                preroll.append(frame)
+                if timeout and now - start > timeout:
+                    return None
+                continue
+            speech_start = now
+            for buffered in preroll:
+                accept(buffered)
+        silence = 0.0 if is_speech else silence + frame_secs
+        accept(frame)
+        if silence >= VAD_END_SILENCE:
+            break
+        if phrase_time_limit and now - speech_start > phrase_time_limit:
+            break
+    pieces.append(json.loads(rec.FinalResult()).get("text", ""))
+    text = " ".join(p for p in pieces if p)
+    return text.lower() or None
 
 def listen(timeout=5, phrase_time_limit=6):
     """Listen via microphone and return lowercase text, or None."""
-    with mic as source:
+    # Don't listen while the bot is still talking, or it hears itself
+    wait_until_spoken()
+    source = _get_mic_source()
+    model = _get_vosk_model()
+    with _mic_lock:
+        _drain_mic(source)
         print(" Listening...")
-        recognizer.adjust_for_ambient_noise(source, duration=0.4)
+        if model is not None:
+            return _listen_local(source, model, timeout, phrase_time_limit)
         try:
             audio = recognizer.listen(source, timeout=timeout, phrase_time_limit=phrase_time_limit)
         except sr.WaitTimeoutError:
@@ -51,25 +205,134 @@ def listen(timeout=5, phrase_time_limit=6):
         speak("Speech recognition service is unavailable.")
         return None
 
+# ====== Wake word detector ======
+WAKEWORD = os.getenv("WAKEWORD", "jarvis").lower()
+WAKEWORD_THRESHOLD = 0.5  # openWakeWord score needed to trigger
+OWW_CHUNK = 1280          # 80 ms at 16 kHz, openWakeWord's native frame
+
+class WakeWordDetector:
+    """
+    Blocks in listen() until the wake word is heard, using a small keyword model
+    instead of full speech recognition. Uses Porcupine when PICOVOICE_ACCESS_KEY
+    is set, otherwise openWakeWord ("hey <wakeword>"). Raises RuntimeError if
+    neither is available.
+    """
+    _engine = None  # (kind, engine, phrase) once loaded, False if no engine could be loaded
+
+    def __init__(self, wakeword=WAKEWORD):
+        if WakeWordDetector._engine is None:
+            try:
+                WakeWordDetector._engine = self._load_engine(wakeword)
+            except Exception:
+                WakeWordDetector._engine = False  # don't retry on every command
+                raise
+        if WakeWordDetector._engine is False:
+            raise RuntimeError("No wake-word engine available.")
+
+    @property
+    def phrase(self):
+        """What the user has to say, e.g. "hey jarvis" for openWakeWord."""
+        return WakeWordDetector._engine[2]
+
+    @staticmethod
+    def _load_engine(wakeword):
+        load_dotenv()
+        access_key = os.getenv("PICOVOICE_ACCESS_KEY")
+        if pvporcupine is not None and access_key and wakeword in pvporcupine.KEYWORDS:
+            return ("porcupine", pvporcupine.create(access_key=access_key, keywords=[wakeword]), wakeword)
+        if OpenWakeWordModel is not None:
+            return ("openwakeword", OpenWakeWordModel(wakeword_models=[f"hey_{wakeword}"]), f"hey {wakeword}")
+        raise RuntimeError("No wake-word engine installed (pvporcupine or openwakeword).")
+
+    def listen(self):
+        """Return once the wake word has been detected on the microphone."""
+        kind, engine, _ = WakeWordDetector._engine
+        wait_until_spoken()
+        source = _get_mic_source()
+        with _mic_lock:
+            _drain_mic(source)
+            if kind == "porcupine":
+                while True:
+                    pcm = np.frombuffer(source.stream.read(engine.frame_length), dtype=np.int16)
+                    if len(pcm) == engine.frame_length and engine.process(pcm) >= 0:
+                        return True
+            engine.reset()
+            while True:
+                pcm = np.frombuffer(source.stream.read(OWW_CHUNK), dtype=np.int16)
+                scores = engine.predict(pcm)
+                if max(scores.values()) > WAKEWORD_THRESHOLD:
+                    return True
+
 # ====== Ollama chat helper ======
-def chat_with_bot(prompt):
-    """Query Ollama streaming API and return full response text."""
+OLLAMA_MODEL = "llama3.2"
+OLLAMA_KEEP_ALIVE = "24h"  # keep the model resident between questions
+CHAT_CACHE_TTL = 300  # seconds before a cached answer is asked again
+CHAT_CACHE_SIZE = 256
+SENTENCE_END_RE = re.compile(r"[.!?](?=\s)|\n")
+
+_chat_cache = OrderedDict()  # (normalized prompt, ttl bucket) -> full response, LRU order
+
+def normalize_prompt(prompt):
+    """Cache key for a prompt: lowercase, punctuation stripped (decimal points kept), whitespace collapsed."""
+    text = re.sub(r"[^\w\s.]|(?<!\d)\.|\.(?!\d)", "", prompt.lower())
+    return re.sub(r"\s+", " ", text).strip()
+
+def split_sentences(buf):
+    """Split complete sentences off buf. Returns (sentences, leftover)."""
+    sentences = []
+    while True:
+        m = SENTENCE_END_RE.search(buf)
+        if not m:
+            return sentences, buf
+        sentence = buf[:m.end()].strip()
+        buf = buf[m.end():]
+        if sentence:
+            sentences.append(sentence)
+
+def chat_stream(prompt):
+    """Yield the Ollama response one sentence at a time as it streams in (cached per prompt)."""
+    key = (normalize_prompt(prompt), int(time.monotonic() // CHAT_CACHE_TTL))
+    cached = _chat_cache.get(key)
+    if cached is not None:
+        _chat_cache.move_to_end(key)
+        sentences, rest = split_sentences(cached)
+        yield from sentences
+        if rest.strip():
+            yield rest.strip()
+        return
+
     response_text = ""
+    buf = ""
     stream = ollama.chat(
-        model="llama3.2",
+        model=OLLAMA_MODEL,
         messages=[{"role": "user", "content": prompt}],
         stream=True,
+        keep_alive=OLLAMA_KEEP_ALIVE,
     )
     for chunk in stream:
         if "message" in chunk and "content" in chunk["message"]:
-            response_text += chunk["message"]["content"]
-    return response_text.strip()
+            piece = chunk["message"]["content"]
+            response_text += piece
+            sentences, buf = split_sentences(buf + piece)
+            yield from sentences
+    if buf.strip():
+        yield buf.strip()
 
-def summarize_response(response):
-    """Return up to three short bullet points from the model response."""
-    sentences = response.replace("\n", " ").split(". ")
-    summary_points = sentences[:3]
-    return "\n".join(f"- {s.strip()}" for s in summary_points if s.strip())
+    # Only complete responses are cached
+    _chat_cache[key] = response_text.strip()
+    if len(_chat_cache) > CHAT_CACHE_SIZE:
+        _chat_cache.popitem(last=False)
+
+def chat_with_bot(prompt):
+    """Query Ollama streaming API and return full response text."""
+    return " ".join(chat_stream(prompt))
+
+def warmup():
+    """Open the mic and load the speech and LLM models ahead of the first request."""
+    _get_mic_source()
+    _get_vosk_model()
+    # An empty message list makes Ollama load the model without generating anything
+    ollama.chat(model=OLLAMA_MODEL, messages=[], keep_alive=OLLAMA_KEEP_ALIVE)
 
 # ====== Main bot loop ======
 def bot_main():
@@ -88,6 +351,7 @@ def bot_main():
             # Exit commands
             if any(cmd in user_input for cmd in ["exit", "quit", "stop", "goodbye", "bye"]):
                 speak("Goodbye!")
+                wait_until_spoken()
                 break
 
             # Real-time simple queries
@@ -101,20 +365,20 @@ def bot_main():
                 speak(get_current_time())
                 continue
 
-            # Forward to Ollama
-            bot_response = chat_with_bot(user_input)
-
-            # If user asked for detail, speak full response; otherwise give a short summary
-            if any(word in user_input for word in ["detail", "detailed", "full", "explain", "tell me more"]):
-                speak(bot_response)
-            else:
-                speak(summarize_response(bot_response))
+            # Forward to Ollama, speaking each sentence as soon as it is generated.
+            # If user asked for detail, speak the full response; otherwise only the first three sentences
+            # (the rest is still read so the complete answer gets cached).
+            detailed = any(word in user_input for word in ["detail", "detailed", "full", "explain", "tell me more"])
+            for i, sentence in enumerate(chat_stream(user_input)):
+                if detailed or i < 3:
+                    speak(sentence)
 
     except KeyboardInterrupt:
         print("\nInterrupted by user. Exiting bot loop.")
     except Exception as e:
         print("Bot encountered an error:", e)
         speak("I encountered an error. Check the console for details.")
+        wait_until_spoken()
 
 if __name__ == "__main__":
     # load environment if present (optional)
@@ -1,87 +1,229 @@
 import cv2
 import face_recognition
+import hashlib
 import numpy as np
 import os
+import queue
+import threading
+
+try:
+    import faiss
+except ImportError:
+    faiss = None  # fall back to the NumPy distance matrix
 
 # --- Constants ---
-ENCODINGS_FILE = "known_faces.npy"
-NAMES_FILE = "known_names.txt"
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+ENCODINGS_FILE = os.path.join(BASE_DIR, "known_faces.npy")
+NAMES_FILE = os.path.join(BASE_DIR, "known_names.txt")
+INDEX_FILE = os.path.join(BASE_DIR, "known_faces.faiss")
 RECOGNITION_TOLERANCE = 0.5  # stricter to avoid false positives
+ENCODING_DIM = 128
+FRAME_WIDTH = 640
+FRAME_HEIGHT = 480
+DOWNSCALE = 4  # detection runs on a 1/DOWNSCALE frame
+HNSW_MIN_FACES = 1000  # below this an exact flat scan beats HNSW
+HNSW_M = 32
 
 # --- Helper Functions ---
 def load_known_faces(encodings_path, names_path):
-    """Loads face encodings and names from files."""
-    known_face_encodings = []
+    """Loads face encodings (as an (N, 128) float32 matrix) and names from files."""
+    known_matrix = np.empty((0, ENCODING_DIM), dtype=np.float32)
     known_face_names = []
     if os.path.exists(encodings_path) and os.path.exists(names_path):
-        known_face_encodings = list(np.load(encodings_path, allow_pickle=True))
+        try:
+            encs = np.load(encodings_path, mmap_mode='r')
+        except ValueError:
+            # Older files were saved as dtype=object and need pickle to load
+            encs = np.load(encodings_path, allow_pickle=True)
+            if encs.ndim == 1:
+                encs = np.stack(encs)  # 1-D object array of per-face arrays
+        if len(encs) > 0:
+            known_matrix = np.ascontiguousarray(encs, dtype=np.float32)
         with open(names_path, "r") as f:
             known_face_names = [line.strip().lower() for line in f.readlines()]
         print(f"Loaded {len(known_face_names)} known faces.")
-    return known_face_encodings, known_face_names
+    return known_matrix, known_face_names
 
-def save_known_faces(encodings, names, encodings_path, names_path):
+def save_known_faces(known_matrix, names, encodings_path, names_path):
     """Saves face encodings and names to files."""
-    np.save(encodings_path, np.array(encodings, dtype=object))
+    # Write then rename: the old file may still be memory-mapped, and truncating it would crash readers
+    tmp_path = encodings_path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        np.save(f, np.ascontiguousarray(known_matrix, dtype=np.float32))
+    os.replace(tmp_path, encodings_path)
     with open(names_path, "w") as f:
         for name in names:
             f.write(f"{name}\n")
     print(f"Saved {len(names)} known faces.")
 
-# --- Main Function ---
-def main():
-    known_face_encodings, known_face_names = load_known_faces(ENCODINGS_FILE, NAMES_FILE)
+def build_face_index(known_matrix):
+    """Builds a FAISS L2 index over the known encodings, or None if FAISS isn't installed."""
+    if faiss is None or len(known_matrix) == 0:
+        return None
+    data = np.ascontiguousarray(known_matrix, dtype=np.float32)
+    if len(known_matrix) >= HNSW_MIN_FACES:
+        # HNSW graph over 8-bit scalar-quantized vectors (4x smaller than float32)
+        index = faiss.IndexHNSWSQ(ENCODING_DIM, faiss.ScalarQuantizer.QT_8bit, HNSW_M)
+        index.train(data)
+    else:
+        index = faiss.IndexFlatL2(ENCODING_DIM)
+    index.add(data)
+    return index
 
-    cap = cv2.VideoCapture(0)
-    if not cap.isOpened():
-        print("Error: Could not open webcam.")
-        return
-    
-    face_locations = []
-    face_encodings = []
-    face_names = []
-    process_this_frame = True
-    
-    print("Starting webcam feed. Press 'q' to quit.")
+def encodings_digest(known_matrix):
+    """Checksum of the encodings an index was built from."""
+    return hashlib.sha1(np.ascontiguousarray(known_matrix, dtype=np.float32).tobytes()).hexdigest()
 
-    while True:
-        ret, frame = cap.read()
-        if not ret:
+def save_face_index(index, known_matrix, index_path):
+    """Writes the FAISS index plus the checksum of the encodings it was built from."""
+    faiss.write_index(index, index_path)
+    with open(index_path + ".sha1", "w") as f:
+        f.write(encodings_digest(known_matrix))
+
+def load_face_index(index_path, known_matrix):
+    """Loads the saved FAISS index if it was built from known_matrix, otherwise rebuilds and saves it."""
+    if faiss is None:
+        return None
+    digest_path = index_path + ".sha1"
+    if os.path.exists(index_path) and os.path.exists(digest_path):
+        with open(digest_path, "r") as f:
+            saved_digest = f.read().strip()
+        if saved_digest == encodings_digest(known_matrix):
+            try:
+                return faiss.read_index(index_path)
+            except RuntimeError as e:
+                print(f"Could not read face index, rebuilding: {e}")
+    index = build_face_index(known_matrix)
+    if index is not None:
+        save_face_index(index, known_matrix, index_path)
+    return index
+
+def match_faces(face_encodings, known_matrix, known_sq, known_face_names, index=None):
+    """Returns a name (or "Unknown") for each encoding, via the FAISS index or one (M, N) distance matrix."""
+    if len(face_encodings) == 0:
+        return []
+    if len(known_matrix) == 0:
+        return ["Unknown"] * len(face_encodings)
+    E = np.asarray(face_encodings, dtype=np.float32)
+    if index is not None:
+        # FAISS L2 indexes return squared distances
+        D, I = index.search(E, 1)
+        matched = D[:, 0] < RECOGNITION_TOLERANCE ** 2
+        return [known_face_names[i] if ok else "Unknown" for i, ok in zip(I[:, 0], matched)]
+    # Squared L2 distances via ||e||^2 - 2 e.k + ||k||^2 (a single gemm)
+    D2 = known_sq[None, :] - 2.0 * (E @ known_matrix.T) + (E * E).sum(1)[:, None]
+    best = D2.argmin(1)
+    matched = D2[np.arange(len(E)), best] < RECOGNITION_TOLERANCE ** 2
+    return [known_face_names[i] if ok else "Unknown" for i, ok in zip(best, matched)]
+
+def put_latest(q, item):
+    """Puts item on a size-1 queue, dropping whatever stale item is already there."""
+    try:
+        q.put_nowait(item)
+    except queue.Full:
+        try:
+            q.get_nowait()
+        except queue.Empty:
+            pass
+        q.put_nowait(item)
+
+def grab_frames(cap, frame_q, state, lock, stop_event):
+    """Capture thread: keeps only the newest frame for display and detection."""
+    while not stop_event.is_set():
+        if not cap.grab():
             print("Error: Failed to capture frame.")
+            stop_event.set()
             break
+        ret, frame = cap.retrieve()
+        if not ret:
+            continue
+        with lock:
+            state["frame"] = frame
+        put_latest(frame_q, frame)
+
+def detect_faces(frame_q, state, lock, stop_event):
+    """Detection thread: locates, encodes and names faces on the newest frame."""
+    # Reused every frame instead of allocating new resize/convert outputs
+    small_buf = None
+    rgb_buf = None
+    while not stop_event.is_set():
+        try:
+            frame = frame_q.get(timeout=0.1)
+        except queue.Empty:
+            continue
+        h, w = frame.shape[:2]
+        small_shape = (h // DOWNSCALE, w // DOWNSCALE, 3)
+        if small_buf is None or small_buf.shape != small_shape:
+            small_buf = np.empty(small_shape, np.uint8)
+            rgb_buf = np.empty_like(small_buf)
+        cv2.resize(frame, (small_shape[1], small_shape[0]), dst=small_buf)
+        rgb_small_frame = cv2.cvtColor(small_buf, cv2.COLOR_BGR2RGB, dst=rgb_buf)
+
+        face_locations = face_recognition.face_locations(rgb_small_frame)
+        face_encodings = face_recognition.face_encodings(rgb_small_frame, face_locations)
 
-        if process_this_frame:
-            small_frame = cv2.resize(frame, (0, 0), fx=0.25, fy=0.25)
-            rgb_small_frame = cv2.cvtColor(small_frame, cv2.COLOR_BGR2RGB)
+        with lock:
+            known_matrix, known_sq, known_face_names, index = state["known"]
+        face_names = match_faces(face_encodings, known_matrix, known_sq, known_face_names, index)
 
-            face_locations = face_recognition.face_locations(rgb_small_frame)
-            face_encodings = face_recognition.face_encodings(rgb_small_frame, face_locations)
+        with lock:
+            state["result"] = (face_locations, face_encodings, face_names)
 
-            face_names = []
-            for face_encoding in face_encodings:
-                name = "Unknown"
-                if len(known_face_encodings) > 0:
-                    face_distances = face_recognition.face_distance(known_face_encodings, face_encoding)
-                    best_match_index = np.argmin(face_distances)
-                    best_distance = face_distances[best_match_index]
+# --- Main Function ---
+def main(stop_event=None):
+    """Runs the recognition window until 'q' is pressed or stop_event is set."""
+    known_matrix, known_face_names = load_known_faces(ENCODINGS_FILE, NAMES_FILE)
+    known_sq = (known_matrix * known_matrix).sum(1)
+    index = load_face_index(INDEX_FILE, known_matrix)
 
-                    if best_distance < RECOGNITION_TOLERANCE:
-                        name = known_face_names[best_match_index]
+    cap = cv2.VideoCapture(0)
+    if not cap.isOpened():
+        print("Error: Could not open webcam.")
+        return
+    cap.set(cv2.CAP_PROP_FRAME_WIDTH, FRAME_WIDTH)
+    cap.set(cv2.CAP_PROP_FRAME_HEIGHT, FRAME_HEIGHT)
+    cap.set(cv2.CAP_PROP_BUFFERSIZE, 1)  # avoid processing stale queued frames
+
+    # Capture and detection run on their own threads; this thread only draws.
+    lock = threading.Lock()
+    if stop_event is None:
+        stop_event = threading.Event()
+    workers_stop = threading.Event()  # also set when capture fails
+    frame_q = queue.Queue(maxsize=1)
+    state = {
+        "frame": None,
+        "result": ([], [], []),
+        "known": (known_matrix, known_sq, known_face_names, index),
+    }
+    workers = [
+        threading.Thread(target=grab_frames, args=(cap, frame_q, state, lock, workers_stop), daemon=True),
+        threading.Thread(target=detect_faces, args=(frame_q, state, lock, workers_stop), daemon=True),
+    ]
+    for t in workers:
+        t.start()
+
+    print("Starting webcam feed. Press 'q' to quit.")
 
-                face_names.append(name)
+    while not stop_event.is_set() and not workers_stop.is_set():
+        with lock:
+            frame = state["frame"]
+            state["frame"] = None
+            face_locations, face_encodings, face_names = state["result"]
 
-        process_this_frame = not process_this_frame
+        if frame is not None:
+            # The detection thread may still be reading this frame, so draw on a copy
+            frame = frame.copy()
 
-        # Draw results
-        for (top, right, bottom, left), name in zip(face_locations, face_names):
-            top, right, bottom, left = top*4, right*4, bottom*4, left*4
-            color = (0, 255, 0) if name != "Unknown" else (0, 0, 255)
-            cv2.rectangle(frame, (left, top), (right, bottom), color, 2)
-            cv2.rectangle(frame, (left, bottom - 35), (right, bottom), color, cv2.FILLED)
-            font = cv2.FONT_HERSHEY_DUPLEX
-            cv2.putText(frame, name, (left + 6, bottom - 6), font, 0.9, (255, 255, 255), 1)
+            # Draw results
+            for (top, right, bottom, left), name in zip(face_locations, face_names):
+                top, right, bottom, left = top*DOWNSCALE, right*DOWNSCALE, bottom*DOWNSCALE, left*DOWNSCALE
+                color = (0, 255, 0) if name != "Unknown" else (0, 0, 255)
+                cv2.rectangle(frame, (left, top), (right, bottom), color, 2)
+                cv2.rectangle(frame, (left, bottom - 35), (right, bottom), color, cv2.FILLED)
+                font = cv2.FONT_HERSHEY_DUPLEX
+                cv2.putText(frame, name, (left + 6, bottom - 6), font, 0.9, (255, 255, 255), 1)
 
-        cv2.imshow('Face Recognition', frame)
+            cv2.imshow('Face Recognition', frame)
 
         key = cv2.waitKey(1) & 0xFF
         if key == ord('q'):
@@ -93,9 +235,16 @@ def main():
 
                 if name:
                     # Allow multiple encodings for the same person
-                    known_face_encodings.append(new_face_encoding)
-                    known_face_names.append(name)
-                    save_known_faces(known_face_encodings, known_face_names, ENCODINGS_FILE, NAMES_FILE)
+                    known_matrix = np.vstack([known_matrix, new_face_encoding.astype(np.float32)[None, :]])
+                    known_sq = (known_matrix * known_matrix).sum(1)
+                    known_face_names = known_face_names + [name]
+                    # Build a fresh index rather than adding to one the detection thread may be searching
+                    index = build_face_index(known_matrix)
+                    with lock:
+                        state["known"] = (known_matrix, known_sq, known_face_names, index)
+                    save_known_faces(known_matrix, known_face_names, ENCODINGS_FILE, NAMES_FILE)
+                    if index is not None:
+                        save_face_index(index, known_matrix, INDEX_FILE)
                 else:
                     print("Invalid name. Face not saved.")
             elif len(face_encodings) == 0:
@@ -103,6 +252,9 @@ def main():
             else:
                 print("Multiple faces detected. Ensure only one 'Unknown' face is visible.")
 
+    workers_stop.set()
+    for t in workers:
+        t.join(timeout=2.0)
     cap.release()
     cv2.destroyAllWindows()
     print("Webcam feed stopped.")
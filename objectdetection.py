@@ -8,6 +8,9 @@ Dependencies:
     pip install mediapipe opencv-python requests
 """
 
+import math
+import queue
+import threading
 import time
 from collections import deque
 import urllib.parse
@@ -16,6 +19,7 @@ import cv2
 import numpy as np
 import mediapipe as mp
 import requests
+from requests.adapters import HTTPAdapter
 
 # ---------- CONFIG ----------
 TARGET_URL = "http://10.42.89.86/servo?"   # provided by you
@@ -28,19 +32,31 @@ DELTA_THRESHOLD = 1.5      # degrees (servo degrees) before sending
 MAX_SEND_HZ = 15.0         # throttle HTTP requests
 ARROW_LENGTH = 80
 REQUEST_TIMEOUT = 0.6      # seconds
+MOTION_THRESHOLD = 3.0     # mean abs diff (0-255) on a 32x24 thumbnail
+MAX_REUSE_AGE = 0.3        # seconds a hand result may be reused on a static scene
 # ----------------------------
 
 min_send_interval = 1.0 / MAX_SEND_HZ
 
-def send_angle_http(target_base_url, angle_int):
+# Per-degree lookup tables for the direction arrow
+SIN_LUT = np.sin(np.deg2rad(np.arange(360))).astype(np.float32)
+COS_LUT = np.cos(np.deg2rad(np.arange(360))).astype(np.float32)
+
+def make_session():
+    """One keep-alive connection to the ESP32, reused for every send."""
+    session = requests.Session()
+    session.mount("http://", HTTPAdapter(pool_connections=1, pool_maxsize=1, max_retries=0))
+    return session
+
+def send_angle_http(session, target_base_url, angle_int):
     """
     Send angle via HTTP GET. Tries ?angle=<n> first, falls back to ?<n>.
     Returns True if request succeeded (status 200-399), else False.
     """
-    # Preferred: ?angle=<n>
-    params = {"angle": str(angle_int)}
+    # Preferred: ?angle=<n> (URL built directly to skip requests' param encoding)
     try:
-        resp = requests.get(target_base_url, params=params, timeout=REQUEST_TIMEOUT)
+        url = f"{target_base_url}angle={angle_int}"
+        resp = session.get(url, timeout=REQUEST_TIMEOUT)
         if 200 <= resp.status_code < 400:
             return True
     except Exception:
@@ -49,7 +65,7 @@ def send_angle_http(target_base_url, angle_int):
     # Fallback: append raw query like ?90
     try:
         url = target_base_url + str(angle_int)
-        resp = requests.get(url, timeout=REQUEST_TIMEOUT)
+        resp = session.get(url, timeout=REQUEST_TIMEOUT)
         if 200 <= resp.status_code < 400:
             return True
     except Exception:
@@ -57,9 +73,35 @@ def send_angle_http(target_base_url, angle_int):
 
     return False
 
-def main():
+def servo_sender(send_q, sent_state, stop_event):
+    """
+    Background sender so the frame loop never waits on the network.
+    Records the last angle the ESP32 accepted in sent_state["angle"].
+    Owns its session, so a request still in flight at shutdown never sees it closed.
+    """
+    session = make_session()
+    try:
+        while not stop_event.is_set():
+            try:
+                angle = send_q.get(timeout=0.1)
+            except queue.Empty:
+                continue
+            if send_angle_http(session, TARGET_URL, angle):
+                sent_state["angle"] = angle
+                # debug:
+                # print("[http] sent", angle)
+            else:
+                print("[http] send failed (timeout or connection issue)")
+    finally:
+        session.close()
+
+def main(stop_event=None):
+    """Run the hand tracker until 'q' is pressed or stop_event is set."""
     mp_hands = mp.solutions.hands
-    hands = mp_hands.Hands(min_detection_confidence=0.7, min_tracking_confidence=0.7)
+    # Only the first hand is used, so track one with the lite model; video mode reuses
+    # tracking between frames instead of running palm detection every time.
+    hands = mp_hands.Hands(static_image_mode=False, max_num_hands=1, model_complexity=0,
+                           min_detection_confidence=0.6, min_tracking_confidence=0.6)
     mp_drawing = mp.solutions.drawing_utils
 
     cap = cv2.VideoCapture(0)
@@ -73,17 +115,30 @@ def main():
         cap.release()
         return
     canvas = np.zeros_like(frame)
+    combined = np.empty_like(frame)  # blend output, reused every frame
 
     angle_history = deque(maxlen=SMOOTH_FRAMES)
+    angle_sum = 0.0  # running sum of angle_history
     points = deque(maxlen=1024)
 
-    last_sent = None
     last_send_time = 0.0
+    sent_state = {"angle": None}
+    send_q = queue.Queue(maxsize=1)
+    if stop_event is None:
+        stop_event = threading.Event()
+    sender_stop = threading.Event()
+    sender = threading.Thread(target=servo_sender, args=(send_q, sent_state, sender_stop), daemon=True)
+    sender.start()
+
+    # Frame-diff gate: skip hands.process() while the scene is static
+    prev_thumb = None
+    results = None
+    results_time = 0.0
 
     print("Running — press 'q' to quit.")
 
     try:
-        while True:
+        while not stop_event.is_set():
             ret, frame = cap.read()
             if not ret:
                 print("Frame read failed — exiting")
@@ -92,9 +147,21 @@ def main():
             frame = cv2.flip(frame, 1)
             height, width, _ = frame.shape
             rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-            results = hands.process(rgb)
+            thumb = cv2.resize(rgb, (32, 24), interpolation=cv2.INTER_AREA)
+            now = time.time()
+            static = (
+                results is not None
+                and prev_thumb is not None
+                and now - results_time < MAX_REUSE_AGE
+                and cv2.absdiff(prev_thumb, thumb).mean() < MOTION_THRESHOLD
+            )
+            if not static:
+                results = hands.process(rgb)
+                results_time = now
+                prev_thumb = thumb
 
             display_angle = None
+            new_point = False
 
             if results.multi_hand_landmarks:
                 for hand_landmarks in results.multi_hand_landmarks:
@@ -107,6 +174,7 @@ def main():
                     pip_x, pip_y = int(pip.x * width), int(pip.y * height)
 
                     points.appendleft((tip_x, tip_y))
+                    new_point = True
 
                     vec_x = tip_x - pip_x
                     vec_y = pip_y - tip_y  # flip y so positive is up
@@ -114,29 +182,31 @@ def main():
                     if vec_x == 0 and vec_y == 0:
                         continue
 
-                    angle_rad = np.arctan2(vec_y, vec_x)
-                    angle_deg = np.degrees(angle_rad)
+                    angle_rad = math.atan2(vec_y, vec_x)
+                    angle_deg = math.degrees(angle_rad)
                     angle_deg_norm = angle_deg % 360
 
+                    if len(angle_history) == angle_history.maxlen:
+                        angle_sum -= angle_history[0]
                     angle_history.append(angle_deg_norm)
-                    display_angle = sum(angle_history) / len(angle_history)
+                    angle_sum += angle_deg_norm
+                    display_angle = angle_sum / len(angle_history)
 
                     # draw arrow and tip circle
-                    end_x = int(tip_x + ARROW_LENGTH * np.cos(np.radians(display_angle)))
-                    end_y = int(tip_y - ARROW_LENGTH * np.sin(np.radians(display_angle)))
+                    ai = int(display_angle) % 360
+                    end_x = tip_x + int(ARROW_LENGTH * COS_LUT[ai])
+                    end_y = tip_y - int(ARROW_LENGTH * SIN_LUT[ai])
                     cv2.arrowedLine(frame, (tip_x, tip_y), (end_x, end_y), (0,0,255), 3, tipLength=0.3)
                     cv2.circle(frame, (tip_x, tip_y), 6, (255,0,0), -1)
                     break
 
-            # draw path
-            for i in range(1, len(points)):
-                if points[i-1] is None or points[i] is None:
-                    continue
-                cv2.line(canvas, points[i-1], points[i], (0,255,0), 2)
+            # draw path: the canvas persists, so only the newest segment needs drawing
+            if new_point and len(points) > 1 and points[1] is not None:
+                cv2.line(canvas, points[1], points[0], (0,255,0), 2)
 
-            combined = cv2.addWeighted(frame, 0.8, canvas, 0.2, 0)
+            cv2.addWeighted(frame, 0.8, canvas, 0.2, 0, dst=combined)
 
-            if display_angle is not None and not np.isnan(display_angle):
+            if display_angle is not None and not math.isnan(display_angle):
                 # Mapping to servo
                 if MAP_360_TO_180:
                     servo_angle = int(display_angle / 2.0)
@@ -155,6 +225,7 @@ def main():
                             cv2.FONT_HERSHEY_SIMPLEX, 0.6, (200,200,200), 1, cv2.LINE_AA)
 
                 now = time.time()
+                last_sent = sent_state["angle"]
                 should_send = True
                 if now - last_send_time < min_send_interval:
                     should_send = False
@@ -162,14 +233,13 @@ def main():
                     should_send = False
 
                 if should_send:
-                    success = send_angle_http(TARGET_URL, servo_angle)
-                    if success:
-                        last_sent = servo_angle
-                        last_send_time = now
-                        # debug:
-                        # print("[http] sent", servo_angle)
-                    else:
-                        print("[http] send failed (timeout or connection issue)")
+                    # Replace any angle still waiting to be sent (this loop is the only producer)
+                    try:
+                        send_q.get_nowait()
+                    except queue.Empty:
+                        pass
+                    send_q.put_nowait(servo_angle)
+                    last_send_time = now
 
             cv2.imshow("Hand -> HTTP Servo", combined)
             cv2.imshow("Canvas", canvas)
@@ -181,6 +251,8 @@ def main():
         print("Interrupted by user")
     finally:
         print("Cleaning up...")
+        sender_stop.set()
+        sender.join(timeout=2 * REQUEST_TIMEOUT + 0.5)
         hands.close()
         cap.release()
         cv2.destroyAllWindows()